@@ -1,24 +1,61 @@
 import pandas as pd
+import csv
 import json
 import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-def analyze_column(df, col):
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def has_renamed_header(csv_path):
+    """Return True if the C parser would rename a header cell (blank or repeated)"""
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f), [])
+    return '' in header or len(set(header)) != len(header)
+
+def compute_column_stats(df):
+    """Compute the per-column statistics analyze_column needs in one batch"""
+    return {
+        'total_rows': len(df),
+        'unique_counts': df.nunique().to_dict(),
+        'null_counts': df.isna().sum().to_dict(),
+        'is_numeric': df.dtypes.map(pd.api.types.is_numeric_dtype).to_dict()
+    }
+
+def first_non_null(series, n):
+    """Return the first n non-null values of series as a list
+    
+    Checks the column in blocks from the top (growing up to 64k rows) and
+    stops as soon as n values are found, so memory stays bounded by a block.
+    """
+    found = []
+    start, size = 0, max(n, 64)
+    while len(found) < n and start < len(series):
+        block = series.iloc[start:start + size]
+        found.extend(block[block.notna()].iloc[:n - len(found)].tolist())
+        start += size
+        size = min(size * 2, 1 << 16)
+    return found
+
+def analyze_column(df, col, stats):
     """Analyze a column to determine what questions make sense"""
     analysis = {
         'name': col,
         'dtype': str(df[col].dtype),
-        'unique_count': df[col].nunique(),
-        'null_count': df[col].isnull().sum(),
-        'sample_values': df[col].dropna().head(5).tolist()
+        'unique_count': stats['unique_counts'][col],
+        'null_count': stats['null_counts'][col],
+        'sample_values': first_non_null(df[col], 5)
     }
     
     # Determine column characteristics
-    total_rows = len(df)
-    unique_ratio = analysis['unique_count'] / total_rows
+    unique_ratio = analysis['unique_count'] / stats['total_rows']
     
     # Categorize the column
-    if pd.api.types.is_numeric_dtype(df[col]):
+    if stats['is_numeric'][col]:
         analysis['is_numeric'] = True
         analysis['can_sum'] = True
         analysis['can_mean'] = True
@@ -36,15 +73,46 @@ def analyze_column(df, col):
         
     return analysis
 
-def generate_question_templates():
-    """Return all possible question templates"""
-    return [
+def value_counts(df, cache, column):
+    """Return df[column].value_counts(), computed once per column"""
+    key = ('value_counts', column)
+    if key not in cache:
+        cache[key] = df[column].value_counts()
+    return cache[key]
+
+def grouped_column(df, cache, column, other_column, agg):
+    """Return df.groupby(column)[other_column].agg() from a per-key aggregate table
+    
+    The columns the groupby templates can sum or average, listed per dataset in
+    cache[('agg_columns', agg)], are aggregated in one groupby per key column.
+    """
+    key = ('grouped', column)
+    if key not in cache:
+        spec = defaultdict(list)
+        for name in ('sum', 'mean'):
+            for c in cache.get(('agg_columns', name), ()):
+                if c != column:
+                    spec[c].append(name)
+        try:
+            cache[key] = df.groupby(column).agg(dict(spec))
+        except Exception:
+            # Don't let one bad column fail every pair for this key
+            cache[key] = None
+    table = cache[key]
+    if table is None or (other_column, agg) not in table.columns:
+        return df.groupby(column)[other_column].agg(agg)
+    return table[(other_column, agg)].rename(other_column)
+
+def _build_templates():
+    """Return all possible question templates, with requirements frozen"""
+    templates = [
         # Value counts questions
         {
             'id': 'value_counts_basic',
             'requires': ['can_value_count'],
             'template': 'How many {entity}s are there for each {column}?',
             'code_template': "df['{column}'].value_counts()",
+            'executor': lambda df, cache, column: value_counts(df, cache, column),
             'difficulty': 1
         },
         {
@@ -52,6 +120,7 @@ def generate_question_templates():
             'requires': ['can_value_count'],
             'template': 'What are the top 5 most common {column}s?',
             'code_template': "df['{column}'].value_counts().head(5)",
+            'executor': lambda df, cache, column: value_counts(df, cache, column).head(5),
             'difficulty': 1
         },
         {
@@ -59,6 +128,7 @@ def generate_question_templates():
             'requires': ['is_categorical'],
             'template': 'How many unique {column}s are there?',
             'code_template': "df['{column}'].nunique()",
+            'executor': lambda df, cache, column: len(value_counts(df, cache, column)),
             'difficulty': 1
         },
         # Numeric aggregations
@@ -67,6 +137,7 @@ def generate_question_templates():
             'requires': ['can_mean'],
             'template': 'What is the average {column}?',
             'code_template': "df['{column}'].mean()",
+            'executor': lambda df, cache, column: df[column].mean(),
             'difficulty': 1
         },
         {
@@ -74,6 +145,7 @@ def generate_question_templates():
             'requires': ['can_sum'],
             'template': 'What is the total {column} across all {entity}s?',
             'code_template': "df['{column}'].sum()",
+            'executor': lambda df, cache, column: df[column].sum(),
             'difficulty': 1
         },
         {
@@ -81,6 +153,7 @@ def generate_question_templates():
             'requires': ['can_rank'],
             'template': 'What is the maximum {column}?',
             'code_template': "df['{column}'].max()",
+            'executor': lambda df, cache, column: df[column].max(),
             'difficulty': 1
         },
         {
@@ -88,6 +161,7 @@ def generate_question_templates():
             'requires': ['can_rank'],
             'template': 'Find the top 5 {entity}s by {column}',
             'code_template': "df.nlargest(5, '{column}')",
+            'executor': lambda df, cache, column: df.nlargest(5, column),
             'difficulty': 1
         },
         # Groupby questions (need two columns)
@@ -97,6 +171,8 @@ def generate_question_templates():
             'requires_other': ['any'],
             'template': 'How many {entity}s does each {column} have?',
             'code_template': "df.groupby('{column}').size()",
+            # Same counts as groupby(column).size(), reusing the cached value_counts
+            'executor': lambda df, cache, column, other_column: value_counts(df, cache, column).sort_index().rename(None),
             'difficulty': 2
         },
         {
@@ -105,6 +181,7 @@ def generate_question_templates():
             'requires_other': ['can_mean'],
             'template': 'What is the average {other_column} for each {column}?',
             'code_template': "df.groupby('{column}')['{other_column}'].mean()",
+            'executor': lambda df, cache, column, other_column: grouped_column(df, cache, column, other_column, 'mean'),
             'difficulty': 2
         },
         {
@@ -113,6 +190,7 @@ def generate_question_templates():
             'requires_other': ['can_sum'],
             'template': 'What is the total {other_column} for each {column}?',
             'code_template': "df.groupby('{column}')['{other_column}'].sum()",
+            'executor': lambda df, cache, column, other_column: grouped_column(df, cache, column, other_column, 'sum'),
             'difficulty': 2
         },
         {
@@ -121,6 +199,7 @@ def generate_question_templates():
             'requires_other': ['can_sum'],
             'template': 'Which {column} has the highest total {other_column}?',
             'code_template': "df.groupby('{column}')['{other_column}'].sum().idxmax()",
+            'executor': lambda df, cache, column, other_column: grouped_column(df, cache, column, other_column, 'sum').idxmax(),
             'difficulty': 2
         },
         # Filtering questions
@@ -129,6 +208,7 @@ def generate_question_templates():
             'requires': ['is_categorical'],
             'template': 'How many {entity}s have {column} equal to "{value}"?',
             'code_template': "len(df[df['{column}'] == '{value}'])",
+            'executor': lambda df, cache, column, value: (df[column].values == value).sum(),
             'difficulty': 1,
             'needs_value': True
         },
@@ -137,6 +217,7 @@ def generate_question_templates():
             'requires': ['is_numeric'],
             'template': 'How many {entity}s have {column} greater than {value}?',
             'code_template': "len(df[df['{column}'] > {value}])",
+            'executor': lambda df, cache, column, value: (df[column].values > value).sum(),
             'difficulty': 1,
             'needs_value': True
         },
@@ -145,20 +226,46 @@ def generate_question_templates():
             'id': 'string_contains',
             'requires': ['is_categorical'],
             'template': 'Find all {entity}s where {column} contains "{substring}"',
-            'code_template': "df[df['{column}'].str.contains('{substring}', na=False)]",
+            'code_template': "df[df['{column}'].str.contains('{substring}', na=False, regex=False)]",
+            'executor': lambda df, cache, column, substring: df[df[column].str.contains(substring, na=False, regex=False)],
             'difficulty': 2,
             'needs_substring': True
         }
     ]
+    
+    for template in templates:
+        template['requires'] = frozenset(template['requires'])
+        if 'requires_other' in template:
+            template['requires_other'] = frozenset(template['requires_other'])
+    
+    return tuple(templates)
+
+_TEMPLATES = _build_templates()
+
+# Every capability flag any template checks on a column
+_CAPABILITIES = frozenset().union(
+    *(template['requires'] | template.get('requires_other', frozenset()) for template in _TEMPLATES)
+)
 
 def generate_questions_for_dataset(csv_path, dataset_name):
     """Generate all possible questions for a dataset"""
-    df = pd.read_csv(csv_path)
+    # The pyarrow parser keeps blank and duplicate headers as-is ('' and x, x) where the
+    # C parser renames them (Unnamed: 0 and x, x.1). Questions must use the names
+    # pd.read_csv gives, so those files go straight to the C parser.
+    df = None
+    if not has_renamed_header(csv_path):
+        try:
+            df = pd.read_csv(csv_path, engine='pyarrow')
+        except ImportError:
+            pass
+    if df is None:
+        df = pd.read_csv(csv_path)
     
     # Analyze all columns
+    stats = compute_column_stats(df)
     column_analysis = {}
     for col in df.columns:
-        column_analysis[col] = analyze_column(df, col)
+        column_analysis[col] = analyze_column(df, col, stats)
     
     # Determine what each row represents (entity type)
     entity_type = dataset_name.replace('.csv', '').rstrip('s')  # Simple singularization
@@ -176,16 +283,33 @@ def generate_questions_for_dataset(csv_path, dataset_name):
         entity_type = 'traffic stop'
     
     questions = []
-    templates = generate_question_templates()
+    cache = {}
+    
+    # Index columns by capability once, so each template only visits eligible columns
+    cap_to_cols = defaultdict(list)
+    for col, analysis in column_analysis.items():
+        for cap in _CAPABILITIES:
+            if analysis.get(cap, False):
+                cap_to_cols[cap].append(col)
+    
+    # Columns the groupby templates aggregate, for grouped_column's shared tables
+    cache[('agg_columns', 'sum')] = cap_to_cols['can_sum']
+    cache[('agg_columns', 'mean')] = cap_to_cols['can_mean']
+    
+    templates_for_col = defaultdict(list)
+    other_cols_for_template = {}
+    for template in _TEMPLATES:
+        eligible = set.intersection(*[set(cap_to_cols[req]) for req in template['requires']])
+        for col in eligible:
+            templates_for_col[col].append(template)
+        
+        if 'requires_other' in template:
+            others = set().union(*[cap_to_cols[req] for req in template['requires_other']])
+            other_cols_for_template[template['id']] = [c for c in df.columns if c in others]
     
     # Generate questions for each column
     for col, analysis in column_analysis.items():
-        for template in templates:
-            # Check if column meets requirements
-            if 'requires' in template:
-                if not all(analysis.get(req, False) for req in template['requires']):
-                    continue
-            
+        for template in templates_for_col[col]:
             # Single column questions
             if 'requires_other' not in template:
                 q = {
@@ -199,14 +323,16 @@ def generate_questions_for_dataset(csv_path, dataset_name):
                 if template.get('needs_value'):
                     if analysis['sample_values']:
                         value = analysis['sample_values'][0]
+                        args = {'column': col, 'value': value}
                         q['question'] = template['template'].format(
                             entity=entity_type,
                             column=col,
                             value=value
                         )
+                        # code_template already quotes string values
                         q['code'] = template['code_template'].format(
                             column=col,
-                            value=value if analysis['is_numeric'] else f"'{value}'"
+                            value=value
                         )
                     else:
                         continue  # Skip if no sample values
@@ -215,6 +341,7 @@ def generate_questions_for_dataset(csv_path, dataset_name):
                     if analysis['sample_values'] and isinstance(analysis['sample_values'][0], str):
                         # Take first 3 characters of a sample value
                         substring = str(analysis['sample_values'][0])[:3]
+                        args = {'column': col, 'substring': substring}
                         q['question'] = template['template'].format(
                             entity=entity_type,
                             column=col,
@@ -228,6 +355,7 @@ def generate_questions_for_dataset(csv_path, dataset_name):
                         continue  # Skip if no string values
                 else:
                     # Standard template without special requirements
+                    args = {'column': col}
                     q['question'] = template['template'].format(
                         entity=entity_type,
                         column=col
@@ -236,7 +364,7 @@ def generate_questions_for_dataset(csv_path, dataset_name):
                 
                 # Execute the code to get the answer
                 try:
-                    result = eval(q['code'])
+                    result = template['executor'](df, cache, **args)
                     q['result'] = str(result)[:200]  # Truncate long results
                     q['status'] = 'valid'
                 except Exception as e:
@@ -248,14 +376,10 @@ def generate_questions_for_dataset(csv_path, dataset_name):
             # Two column questions (groupby)
             else:
                 # Find other suitable columns
-                for other_col, other_analysis in column_analysis.items():
+                for other_col in other_cols_for_template[template['id']]:
                     if other_col == col:
                         continue
                     
-                    # Check if other column meets requirements
-                    if not any(other_analysis.get(req, False) for req in template['requires_other']):
-                        continue
-                    
                     q = {
                         'dataset': dataset_name,
                         'template_id': template['id'],
@@ -275,7 +399,7 @@ def generate_questions_for_dataset(csv_path, dataset_name):
                     
                     # Execute the code
                     try:
-                        result = eval(q['code'])
+                        result = template['executor'](df, cache, column=col, other_column=other_col)
                         q['result'] = str(result)[:200]
                         q['status'] = 'valid'
                     except Exception as e:
@@ -286,10 +410,20 @@ def generate_questions_for_dataset(csv_path, dataset_name):
     
     return questions
 
+def dump_indented(data, depth):
+    """Serialize data like json.dump(indent=2), nested depth spaces deep, as bytes"""
+    if orjson is not None:
+        text = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        text = json.dumps(data, indent=2).encode()
+    # Newlines inside strings are escaped, so every raw newline is indentation
+    return text.replace(b'\n', b'\n' + b' ' * depth)
+
 def main():
     """Generate questions for all datasets"""
     datasets_dir = '../datasets'
-    all_questions = []
+    total_questions = 0
+    valid_total = 0
     
     # Process each dataset
     datasets = [
@@ -301,38 +435,57 @@ def main():
         'tickets-tiny.csv'
     ]
     
-    for dataset in datasets:
-        csv_path = os.path.join(datasets_dir, dataset)
-        if os.path.exists(csv_path):
-            print(f"\nProcessing {dataset}...")
-            questions = generate_questions_for_dataset(csv_path, dataset)
-            all_questions.extend(questions)
-            print(f"Generated {len(questions)} questions")
+    # Questions are streamed to the file one dataset at a time, in json.dump(indent=2)
+    # layout, so the counts are written after the questions array once they are known.
+    # The file is written next to the output and swapped in at the end, so a failure
+    # part-way leaves the previous bank intact.
+    output_path = 'question_bank_raw.json'
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'{\n  "generated_at": ' + dump_indented(datetime.now().isoformat(), 2) + b',\n  "questions": [')
             
-            # Show some examples
-            valid_questions = [q for q in questions if q['status'] == 'valid']
-            print(f"Valid questions: {len(valid_questions)}")
-            if valid_questions:
-                print("\nExample questions:")
-                for q in valid_questions[:3]:
-                    print(f"- {q['question']}")
-                    print(f"  Code: {q['code']}")
-                    print(f"  Result: {q['result'][:50]}...")
-    
-    # Save all questions
-    output = {
-        'generated_at': datetime.now().isoformat(),
-        'total_questions': len(all_questions),
-        'valid_questions': len([q for q in all_questions if q['status'] == 'valid']),
-        'questions': all_questions
-    }
-    
-    with open('question_bank_raw.json', 'w') as f:
-        json.dump(output, f, indent=2)
+            # Datasets are independent, so generate them in parallel processes
+            with ProcessPoolExecutor() as executor:
+                futures = {}
+                for dataset in datasets:
+                    csv_path = os.path.join(datasets_dir, dataset)
+                    if os.path.exists(csv_path):
+                        futures[dataset] = executor.submit(generate_questions_for_dataset, csv_path, dataset)
+                
+                # Collect in dataset order so the output is deterministic. Each future is
+                # popped before its result is written, so a dataset's questions are
+                # released once they are on disk instead of staying reachable via futures.
+                for dataset in list(futures):
+                    print(f"\nProcessing {dataset}...")
+                    questions = futures.pop(dataset).result()
+                    for q in questions:
+                        f.write(b',\n    ' if total_questions else b'\n    ')
+                        f.write(dump_indented(q, 4))
+                        total_questions += 1
+                    print(f"Generated {len(questions)} questions")
+                    
+                    # Show some examples
+                    valid_questions = [q for q in questions if q['status'] == 'valid']
+                    valid_total += len(valid_questions)
+                    print(f"Valid questions: {len(valid_questions)}")
+                    if valid_questions:
+                        print("\nExample questions:")
+                        for q in valid_questions[:3]:
+                            print(f"- {q['question']}")
+                            print(f"  Code: {q['code']}")
+                            print(f"  Result: {q['result'][:50]}...")
+            
+            f.write(b'\n  ],' if total_questions else b'],')
+            f.write(f'\n  "total_questions": {total_questions},\n  "valid_questions": {valid_total}\n}}'.encode())
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
     
-    print(f"\n\nTotal questions generated: {len(all_questions)}")
-    print(f"Valid questions: {output['valid_questions']}")
+    print(f"\n\nTotal questions generated: {total_questions}")
+    print(f"Valid questions: {valid_total}")
     print("Saved to question_bank_raw.json")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,25 +1,55 @@
 import pandas as pd
+import numpy as np
+import csv
 import json
 import os
 import random
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 
-def analyze_column(df, col):
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def has_renamed_header(csv_path):
+    """Return True if the C parser would rename a header cell (blank or repeated)"""
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f), [])
+    return '' in header or len(set(header)) != len(header)
+
+def analyze_column(s, is_numeric):
     """Analyze a column to determine what questions make sense"""
+    col = s.name
+    arr = s.to_numpy()
+    
+    # One null mask drives the null count, unique count and samples
+    if arr.dtype.kind == 'f':
+        null_mask = np.isnan(arr)
+    elif arr.dtype.kind in 'iub':
+        null_mask = np.zeros(len(arr), dtype=bool)
+    else:
+        null_mask = pd.isna(arr)
+    null_count = int(null_mask.sum())
+    
     analysis = {
         'name': col,
-        'dtype': str(df[col].dtype),
-        'unique_count': df[col].nunique(),
-        'null_count': df[col].isnull().sum(),
-        'sample_values': df[col].dropna().head(10).tolist()
+        'dtype': str(s.dtype),
+        # pd.unique keeps NaN as a value, nunique() doesn't
+        'unique_count': pd.unique(arr).size - (1 if null_count else 0),
+        'null_count': null_count,
+        'sample_values': arr[(~null_mask).nonzero()[0][:10]].tolist()
     }
     
     # Determine column characteristics
-    total_rows = len(df)
+    total_rows = len(s)
     unique_ratio = analysis['unique_count'] / total_rows
     
     # Categorize the column
-    if pd.api.types.is_numeric_dtype(df[col]):
+    if is_numeric:
         analysis['is_numeric'] = True
         analysis['can_sum'] = True
         analysis['can_mean'] = True
@@ -38,25 +68,30 @@ def analyze_column(df, col):
         
     return analysis
 
-def create_column_description(col_name, sample_values):
+# Keyword rules in priority order; the anchored lookaheads make the first
+# matching rule win, not the leftmost keyword in the name
+_DESCRIPTION_RE = re.compile(
+    r'^(?:(?=.*(name))|(?=.*(date|year))|(?=.*(price|cost))|(?=.*(count|number))'
+    r'|(?=.*(id))|(?=.*(status))|(?=.*(type|category)))',
+    re.IGNORECASE | re.DOTALL
+)
+_DESCRIPTION_LABELS = (
+    "Name identifier",
+    "Date/time information",
+    "Price in dollars",
+    "Count or quantity",
+    "Unique identifier",
+    "Current status",
+    "Category or type"
+)
+
+@lru_cache(maxsize=512)
+def create_column_description(col_name):
     """Create a human-friendly column description"""
-    # Common patterns
-    if 'name' in col_name.lower():
-        return "Name identifier"
-    elif 'date' in col_name.lower() or 'year' in col_name.lower():
-        return "Date/time information"
-    elif 'price' in col_name.lower() or 'cost' in col_name.lower():
-        return "Price in dollars"
-    elif 'count' in col_name.lower() or 'number' in col_name.lower():
-        return "Count or quantity"
-    elif 'id' in col_name.lower():
-        return "Unique identifier"
-    elif 'status' in col_name.lower():
-        return "Current status"
-    elif 'type' in col_name.lower() or 'category' in col_name.lower():
-        return "Category or type"
-    else:
-        return "Data field"
+    match = _DESCRIPTION_RE.match(col_name)
+    if match:
+        return _DESCRIPTION_LABELS[match.lastindex - 1]
+    return "Data field"
 
 def generate_question_templates():
     """Return question templates that follow CLAUDE.md guidelines"""
@@ -205,154 +240,288 @@ def generate_question_templates():
         }
     ]
 
+_TEMPLATES = tuple(generate_question_templates())
+# Split once so the column loop doesn't re-test 'requires_other' per template
+_SINGLE_TEMPLATES = tuple(t for t in _TEMPLATES if 'requires_other' not in t)
+_GROUPBY_TEMPLATES = tuple(t for t in _TEMPLATES if 'requires_other' in t)
+
+def _templates_by_capability(templates):
+    """Map each required capability to the positions of the templates needing it"""
+    by_cap = defaultdict(list)
+    for position, template in enumerate(templates):
+        for req in template['requires']:
+            by_cap[req].append(position)
+    return dict(by_cap)
+
+_SINGLE_TEMPLATES_BY_CAP = _templates_by_capability(_SINGLE_TEMPLATES)
+_GROUPBY_TEMPLATES_BY_CAP = _templates_by_capability(_GROUPBY_TEMPLATES)
+
+def candidate_templates(templates, templates_by_cap, analysis):
+    """Return the templates whose requirements a column meets, in template order"""
+    positions = set()
+    for cap, cap_positions in templates_by_cap.items():
+        if analysis.get(cap, False):
+            positions.update(cap_positions)
+    
+    candidates = [templates[i] for i in sorted(positions)]
+    # Templates with several requirements still need all of them
+    return [t for t in candidates if all(analysis.get(req, False) for req in t['requires'])]
+
+_EXPLANATION_TEMPLATES = {
+    'filtering': "Boolean filtering selects rows where a condition is True. Use df[condition] syntax.",
+    'sort_values': "sort_values() orders the dataframe by a column. Use ascending=False for highest first.",
+    'head': "head(n) returns the first n rows. Combine with sort_values() to find top/bottom values.",
+    'value_counts': "value_counts() counts occurrences of each unique value. Add normalize=True for percentages.",
+    'mean': "mean() calculates the average of numeric values. Use on a column to get its average.",
+    'sum': "sum() adds up values. On boolean conditions, it counts True values (True=1, False=0).",
+    'groupby': "groupby() splits data into groups. Follow with an aggregation like sum() or mean().",
+    'isin': "isin() checks if values are in a list. Returns True/False for each row.",
+    'boolean indexing': "Create True/False conditions to filter data. Use & for AND, | for OR."
+}
+
+@lru_cache(maxsize=128)
+def build_explanation(concepts):
+    """Build the explanation for a tuple of concepts (shared by every question using them)"""
+    explanations = []
+    for concept in concepts:
+        if concept in _EXPLANATION_TEMPLATES:
+            explanations.append(_EXPLANATION_TEMPLATES[concept])
+    
+    return ' '.join(explanations[:2])  # Use first 2 explanations
+
+# What one row of each dataset represents
+_ENTITY_TYPES = {
+    'powerplants.csv': 'power plant',
+    'motorcycles.csv': 'motorcycle',
+    'foods.csv': 'pet food product',
+    'grammys.csv': 'Grammy nomination',
+    'race-places.csv': 'race result',
+    'tickets-tiny.csv': 'traffic stop',
+    'crops.csv': 'crop',
+    'wreckers.csv': 'tow truck',
+    'overflows.csv': 'overflow event',
+    'forces.csv': 'force measurement',
+    'injurydat-cleaned.csv': 'injury report',
+    'township-154.csv': 'township record',
+    'boston_house_prices.csv': 'house',
+    'msft.csv': 'stock trading day'
+}
+
 def generate_questions_for_dataset(csv_path, dataset_name):
     """Generate questions following CLAUDE.md guidelines"""
-    df = pd.read_csv(csv_path)
+    # The pyarrow parser keeps blank and duplicate headers as-is ('' and x, x) where the
+    # C parser renames them (Unnamed: 0 and x, x.1). Questions must use the names
+    # pd.read_csv gives, so those files go straight to the C parser.
+    df = None
+    if not has_renamed_header(csv_path):
+        try:
+            df = pd.read_csv(csv_path, engine='pyarrow')
+        except ImportError:
+            pass
+    if df is None:
+        df = pd.read_csv(csv_path)
     
-    # Sample the dataframe for preview
+    # Sample the dataframe for preview, as one list of values per column
     preview_df = df.head(5)
+    col_to_preview = {c: preview_df[c].tolist() for c in df.columns}
     
     # Analyze all columns
+    numeric_cols = set(df.columns[df.dtypes.map(pd.api.types.is_numeric_dtype)])
     column_analysis = {}
     for col in df.columns:
-        column_analysis[col] = analyze_column(df, col)
+        column_analysis[col] = analyze_column(df[col], col in numeric_cols)
+    
+    # Value counts and medians are shared by several templates, so compute them once
+    common_values_cache = {}
+    median_cache = {}
+    for col, analysis in column_analysis.items():
+        if analysis.get('is_identifier', False):
+            continue
+        if analysis.get('can_filter', False):
+            # Only sort the repeated values; the stable sort keeps value_counts() tie order
+            value_counts = df[col].value_counts(sort=False)
+            repeated = value_counts[value_counts > 1].sort_values(ascending=False, kind='stable')
+            common_values_cache[col] = repeated.index[:10].tolist()
+        if analysis['is_numeric']:
+            median_cache[col] = df[col].median()
     
     # Determine entity type
-    entity_type_map = {
-        'powerplants.csv': 'power plant',
-        'motorcycles.csv': 'motorcycle',
-        'foods.csv': 'pet food product',
-        'grammys.csv': 'Grammy nomination',
-        'race-places.csv': 'race result',
-        'tickets-tiny.csv': 'traffic stop',
-        'crops.csv': 'crop',
-        'wreckers.csv': 'tow truck',
-        'overflows.csv': 'overflow event',
-        'forces.csv': 'force measurement',
-        'injurydat-cleaned.csv': 'injury report',
-        'township-154.csv': 'township record',
-        'boston_house_prices.csv': 'house',
-        'msft.csv': 'stock trading day'
-    }
+    entity_type = _ENTITY_TYPES.get(dataset_name, 'record')
+    dataset_stem = dataset_name.removesuffix('.csv')
     
-    entity_type = entity_type_map.get(dataset_name, 'record')
+    # Columns usable as preview context, and for each column the others among them
+    non_id_cols = [c for c in df.columns if not column_analysis[c].get('is_identifier', False)]
+    other_cols_by_col = {c: [x for x in non_id_cols if x != c] for c in non_id_cols}
     
     questions = []
-    templates = generate_question_templates()
     question_id = 1
     
-    # Generate questions for each column
-    for col, analysis in column_analysis.items():
-        # Skip ID columns and high-cardinality columns
-        if analysis.get('is_identifier', False):
-            continue
-            
-        for template in templates:
-            # Check if column meets requirements
-            if 'requires' in template:
-                if not all(analysis.get(req, False) for req in template['requires']):
-                    continue
+    # Generate questions for each column, skipping ID and high-cardinality columns
+    usable_cols = [(c, column_analysis[c]) for c in non_id_cols]
+    for col, analysis in usable_cols:
+        # Seeded per column so the picked values are reproducible across runs and workers
+        rng = random.Random(f"{dataset_name}:{col}")
             
+        for template in candidate_templates(_SINGLE_TEMPLATES, _SINGLE_TEMPLATES_BY_CAP, analysis):
             # Single column questions
-            if 'requires_other' not in template:
-                # Handle different value requirements
-                if template.get('needs_value'):
-                    # Get appropriate sample values
-                    if analysis['sample_values']:
-                        # Pick a value that appears multiple times
-                        value_counts = df[col].value_counts()
-                        common_values = value_counts[value_counts > 1].index.tolist()[:5]
-                        if common_values:
-                            value = random.choice(common_values)
-                        else:
-                            continue
-                            
-                        if template.get('use_value_in_question'):
-                            # Special case: use value directly in question
-                            question_text = template['template'].format(
-                                entity=entity_type,
-                                value=value
-                            )
-                        else:
-                            question_text = template['template'].format(
-                                entity=entity_type,
-                                column=col,
-                                value=value
-                            )
-                        
-                        if analysis['is_numeric']:
-                            code = template['code_template'].format(column=col, value=value)
-                        else:
-                            code = template['code_template'].format(column=col, value=value)
+            # Handle different value requirements
+            if template.get('needs_value'):
+                # Get appropriate sample values
+                if analysis['sample_values']:
+                    # Pick a value that appears multiple times
+                    common_values = common_values_cache[col][:5]
+                    if common_values:
+                        value = rng.choice(common_values)
                     else:
                         continue
                         
-                elif template.get('needs_numeric_value'):
-                    if analysis['is_numeric'] and analysis['sample_values']:
-                        # Use median as threshold
-                        median_val = df[col].median()
+                    if template.get('use_value_in_question'):
+                        # Special case: use value directly in question
                         question_text = template['template'].format(
                             entity=entity_type,
-                            column=col,
-                            value=round(median_val, 2)
+                            value=value
                         )
-                        code = template['code_template'].format(
+                    else:
+                        question_text = template['template'].format(
+                            entity=entity_type,
                             column=col,
-                            value=round(median_val, 2)
+                            value=value
                         )
+                    
+                    if analysis['is_numeric']:
+                        code = template['code_template'].format(column=col, value=value)
                     else:
-                        continue
-                        
-                elif template.get('needs_two_values'):
-                    if analysis['sample_values'] and len(analysis['sample_values']) >= 2:
-                        value_counts = df[col].value_counts()
-                        common_values = value_counts[value_counts > 1].index.tolist()[:10]
-                        if len(common_values) >= 2:
-                            value1, value2 = random.sample(common_values, 2)
-                            question_text = template['template'].format(
-                                entity=entity_type,
-                                column=col,
-                                value1=value1,
-                                value2=value2
-                            )
-                            code = template['code_template'].format(
-                                column=col,
-                                value1=value1,
-                                value2=value2
-                            )
-                        else:
-                            continue
-                    else:
-                        continue
+                        code = template['code_template'].format(column=col, value=value)
                 else:
-                    # Standard template
+                    continue
+                    
+            elif template.get('needs_numeric_value'):
+                if analysis['is_numeric'] and analysis['sample_values']:
+                    # Use median as threshold
+                    median_val = median_cache[col]
                     question_text = template['template'].format(
                         entity=entity_type,
-                        column=col
+                        column=col,
+                        value=round(median_val, 2)
+                    )
+                    code = template['code_template'].format(
+                        column=col,
+                        value=round(median_val, 2)
                     )
-                    code = template['code_template'].format(column=col)
+                else:
+                    continue
+                    
+            elif template.get('needs_two_values'):
+                if analysis['sample_values'] and len(analysis['sample_values']) >= 2:
+                    common_values = common_values_cache[col]
+                    if len(common_values) >= 2:
+                        value1, value2 = rng.sample(common_values, 2)
+                        question_text = template['template'].format(
+                            entity=entity_type,
+                            column=col,
+                            value1=value1,
+                            value2=value2
+                        )
+                        code = template['code_template'].format(
+                            column=col,
+                            value1=value1,
+                            value2=value2
+                        )
+                    else:
+                        continue
+                else:
+                    continue
+            else:
+                # Standard template
+                question_text = template['template'].format(
+                    entity=entity_type,
+                    column=col
+                )
+                code = template['code_template'].format(column=col)
+            
+            # Create data preview
+            preview_cols = [col]
+            if len(df.columns) > 1:
+                # Add 1-2 more relevant columns
+                other_cols = other_cols_by_col[col]
+                preview_cols.extend(other_cols[:min(2, len(other_cols))])
+            
+            preview_data = [preview_cols] + list(map(list, zip(*(col_to_preview[c] for c in preview_cols))))
+            
+            # Create column descriptions
+            col_descriptions = {}
+            for pc in preview_cols:
+                col_descriptions[pc] = create_column_description(pc)
+            
+            # Create the question
+            q = {
+                'id': f"{dataset_stem}_{template['id']}_{question_id:03d}",
+                'dataset': dataset_name,
+                'dataPreview': preview_data,
+                'columnDescriptions': col_descriptions,
+                'context': f"Working with {entity_type} data.",
+                'question': question_text,
+                'canonicalAnswer': {
+                    'code': code,
+                    'result': 'Computed result'
+                },
+                'difficulty': template['difficulty'],
+                'concepts': template['concepts'],
+                'hint': f"Use {template['concepts'][0]} to solve this",
+                'explanation': build_explanation(tuple(template['concepts']))
+            }
+            
+            questions.append(q)
+            question_id += 1
+            
+        for template in candidate_templates(_GROUPBY_TEMPLATES, _GROUPBY_TEMPLATES_BY_CAP, analysis):
+            # Two column questions (groupby)
+            # Find suitable other columns
+            pairs_emitted = 0
+            for other_col in other_cols_by_col[col]:
+                other_analysis = column_analysis[other_col]
+                
+                # Check if other column meets requirements
+                meets_requirements = False
+                for req in template['requires_other']:
+                    if req == 'any' or other_analysis.get(req, False):
+                        meets_requirements = True
+                        break
+                
+                if not meets_requirements:
+                    continue
+                
+                question_text = template['template'].format(
+                    entity=entity_type,
+                    column=col,
+                    other_column=other_col
+                )
+                code = template['code_template'].format(
+                    column=col,
+                    other_column=other_col
+                )
                 
-                # Create data preview
-                preview_cols = [col]
-                if len(df.columns) > 1:
-                    # Add 1-2 more relevant columns
-                    other_cols = [c for c in df.columns if c != col and not column_analysis[c].get('is_identifier', False)]
-                    preview_cols.extend(other_cols[:min(2, len(other_cols))])
+                # Create data preview with both columns
+                preview_cols = [col, other_col]
+                if len(df.columns) > 2:
+                    # Add one more column if available
+                    extra_col = next((c for c in other_cols_by_col[col] if c != other_col), None)
+                    if extra_col is not None:
+                        preview_cols.append(extra_col)
                 
-                preview_data = [preview_cols] + preview_df[preview_cols].values.tolist()
+                preview_data = [preview_cols] + list(map(list, zip(*(col_to_preview[c] for c in preview_cols))))
                 
                 # Create column descriptions
                 col_descriptions = {}
                 for pc in preview_cols:
-                    col_descriptions[pc] = create_column_description(pc, column_analysis[pc]['sample_values'])
+                    col_descriptions[pc] = create_column_description(pc)
                 
-                # Create the question
                 q = {
-                    'id': f"{dataset_name.replace('.csv', '')}_{template['id']}_{question_id:03d}",
+                    'id': f"{dataset_stem}_{template['id']}_{question_id:03d}",
                     'dataset': dataset_name,
                     'dataPreview': preview_data,
                     'columnDescriptions': col_descriptions,
-                    'context': f"Working with {entity_type} data.",
+                    'context': f"Analyzing {entity_type} data by categories.",
                     'question': question_text,
                     'canonicalAnswer': {
                         'code': code,
@@ -360,104 +529,29 @@ def generate_questions_for_dataset(csv_path, dataset_name):
                     },
                     'difficulty': template['difficulty'],
                     'concepts': template['concepts'],
-                    'hint': f"Use {template['concepts'][0]} to solve this"
+                    'hint': f"Use {' and '.join(template['concepts'])} to solve this",
+                    'explanation': build_explanation(tuple(template['concepts']))
                 }
                 
                 questions.append(q)
                 question_id += 1
                 
-            # Two column questions (groupby)
-            else:
-                # Find suitable other columns
-                for other_col, other_analysis in column_analysis.items():
-                    if other_col == col or other_analysis.get('is_identifier', False):
-                        continue
-                    
-                    # Check if other column meets requirements
-                    meets_requirements = False
-                    for req in template['requires_other']:
-                        if req == 'any' or other_analysis.get(req, False):
-                            meets_requirements = True
-                            break
-                    
-                    if not meets_requirements:
-                        continue
-                    
-                    question_text = template['template'].format(
-                        entity=entity_type,
-                        column=col,
-                        other_column=other_col
-                    )
-                    code = template['code_template'].format(
-                        column=col,
-                        other_column=other_col
-                    )
-                    
-                    # Create data preview with both columns
-                    preview_cols = [col, other_col]
-                    if len(df.columns) > 2:
-                        # Add one more column if available
-                        extra_cols = [c for c in df.columns if c not in preview_cols and not column_analysis[c].get('is_identifier', False)]
-                        if extra_cols:
-                            preview_cols.append(extra_cols[0])
-                    
-                    preview_data = [preview_cols] + preview_df[preview_cols].values.tolist()
-                    
-                    # Create column descriptions
-                    col_descriptions = {}
-                    for pc in preview_cols:
-                        col_descriptions[pc] = create_column_description(pc, column_analysis[pc]['sample_values'])
-                    
-                    q = {
-                        'id': f"{dataset_name.replace('.csv', '')}_{template['id']}_{question_id:03d}",
-                        'dataset': dataset_name,
-                        'dataPreview': preview_data,
-                        'columnDescriptions': col_descriptions,
-                        'context': f"Analyzing {entity_type} data by categories.",
-                        'question': question_text,
-                        'canonicalAnswer': {
-                            'code': code,
-                            'result': 'Computed result'
-                        },
-                        'difficulty': template['difficulty'],
-                        'concepts': template['concepts'],
-                        'hint': f"Use {' and '.join(template['concepts'])} to solve this"
-                    }
-                    
-                    questions.append(q)
-                    question_id += 1
-                    
-                    # Limit groupby questions per column pair
-                    if question_id % 5 == 0:
-                        break
-    
-    return questions
+                # Limit groupby questions per column and template
+                pairs_emitted += 1
+                if pairs_emitted >= 4:
+                    break
 
-def add_explanations(questions):
-    """Add explanations to questions based on their type"""
-    explanation_templates = {
-        'filtering': "Boolean filtering selects rows where a condition is True. Use df[condition] syntax.",
-        'sort_values': "sort_values() orders the dataframe by a column. Use ascending=False for highest first.",
-        'head': "head(n) returns the first n rows. Combine with sort_values() to find top/bottom values.",
-        'value_counts': "value_counts() counts occurrences of each unique value. Add normalize=True for percentages.",
-        'mean': "mean() calculates the average of numeric values. Use on a column to get its average.",
-        'sum': "sum() adds up values. On boolean conditions, it counts True values (True=1, False=0).",
-        'groupby': "groupby() splits data into groups. Follow with an aggregation like sum() or mean().",
-        'isin': "isin() checks if values are in a list. Returns True/False for each row.",
-        'boolean indexing': "Create True/False conditions to filter data. Use & for AND, | for OR."
-    }
-    
-    for q in questions:
-        # Build explanation based on concepts
-        explanations = []
-        for concept in q['concepts']:
-            if concept in explanation_templates:
-                explanations.append(explanation_templates[concept])
-        
-        q['explanation'] = ' '.join(explanations[:2])  # Use first 2 explanations
-        
     return questions
 
+def write_json(path, data):
+    """Write data as indented JSON, using orjson when it is installed"""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
 def main():
     """Generate questions for multiple datasets"""
     # Change to parent directory to access datasets
@@ -480,13 +574,22 @@ def main():
         'forces.csv'
     ]
     
-    for dataset in datasets:
-        csv_path = os.path.join(datasets_dir, dataset)
-        if os.path.exists(csv_path):
+    # List the datasets directory once instead of probing each file
+    present = {entry.name for entry in os.scandir(datasets_dir) if entry.is_file()}
+    
+    # Datasets are independent, so generate them in parallel processes
+    with ProcessPoolExecutor() as executor:
+        futures = {}
+        for dataset in datasets:
+            if dataset in present:
+                csv_path = os.path.join(datasets_dir, dataset)
+                futures[dataset] = executor.submit(generate_questions_for_dataset, csv_path, dataset)
+        
+        # Collect in dataset order so the output is deterministic
+        for dataset, future in futures.items():
             print(f"\nProcessing {dataset}...")
             try:
-                questions = generate_questions_for_dataset(csv_path, dataset)
-                questions = add_explanations(questions)
+                questions = future.result()
                 all_questions.extend(questions)
                 print(f"Generated {len(questions)} questions")
             except Exception as e:
@@ -501,8 +604,7 @@ def main():
     }
     
     # Save the generated questions
-    with open('../generated_questions_pool.json', 'w') as f:
-        json.dump(output, f, indent=2)
+    write_json('../generated_questions_pool.json', output)
     
     print(f"\n\nTotal questions generated: {len(all_questions)}")
     print("Saved to generated_questions_pool.json")
@@ -1,155 +1,282 @@
 import pandas as pd
+import ast
+import csv
 import json
 import os
+import re
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, groupby
+from operator import itemgetter
+from types import MappingProxyType
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Column names that look like identifiers (substring match, as before) and the
+# aggregations that are meaningless on them
+_ID_RE = re.compile(r'id|code|number|zip', re.IGNORECASE)
+_OP_RE = re.compile(r'\.(?:mean|sum)\(\)')
+
+# Builtins visible to question code, and every name it may refer to
+_EVAL_BUILTINS = {'len': len, 'sum': sum, 'min': min, 'max': max}
+_EVAL_NAMES = frozenset(_EVAL_BUILTINS) | {'df', 'pd'}
+
+# Evaluation flags; a question is kept only when both are still set
+FLAG_MAKES_SENSE = 1 << 0
+FLAG_MEANINGFUL = 1 << 1
+FLAG_OK = FLAG_MAKES_SENSE | FLAG_MEANINGFUL
+
+# Fixed rejection reasons (the groupby and execution-error ones are formatted per question)
+REASON_ID_AGGREGATE = sys.intern('Calculating mean/sum of IDs or codes is not meaningful')
+REASON_EMPTY = sys.intern('Query returns empty result')
+REASON_TOO_MANY = sys.intern('Result has too many categories to be useful')
+
+# Semantically odd phrasings and why they get rejected. The phrases are plain
+# "word1 word2" substrings; one alternation finds them all in a single scan.
+_ODD_PATTERNS = (
+    ('average name', sys.intern('Cannot average names')),
+    ('sum category', sys.intern('Cannot sum categories')),
+    ('total id', sys.intern('Summing IDs is not meaningful')),
+)
+_ODD_RE = re.compile('|'.join(f'({re.escape(phrase)})' for phrase, _ in _ODD_PATTERNS))
+
+# Every fixed rejection message, mapped to its one interned object
+_FIXED_REASONS = {reason: reason for reason in (
+    REASON_ID_AGGREGATE, REASON_EMPTY, REASON_TOO_MANY, *(reason for _, reason in _ODD_PATTERNS)
+)}
+
+# Context blurb shown with each dataset's questions
+_CONTEXTS = MappingProxyType({
+    'powerplants.csv': 'This dataset contains information about US power plants including their location, energy source, and production capacity.',
+    'motorcycles.csv': 'This dataset contains technical specifications for motorcycles from various manufacturers.',
+    'foods.csv': 'This dataset contains nutritional information for pet food products.',
+    'grammys.csv': 'This dataset contains Grammy award nominations and winners from 1990-2023.',
+    'race-places.csv': 'This dataset contains race results for various drivers over multiple years.',
+    'tickets-tiny.csv': 'This dataset contains traffic violation records with demographic information.'
+})
+
+# Hints by template_id
+_HINTS = MappingProxyType({
+    'value_counts_basic': 'Count how many times each value appears',
+    'groupby_mean': 'Group the data first, then calculate the average',
+    'filter_equals': 'Filter the dataframe to only include matching rows',
+    'nlargest': 'Find the rows with the highest values',
+    'string_contains': 'Use string methods to search for partial matches'
+})
 
 def load_questions():
-    """Load the raw question bank"""
+    """Load the raw question bank, using orjson when it is installed"""
+    if orjson is not None:
+        with open('question_bank_raw.json', 'rb') as f:
+            return orjson.loads(f.read())
     with open('question_bank_raw.json', 'r') as f:
         return json.load(f)
 
-def evaluate_question(question, df):
+def dump_indented(data, depth):
+    """Serialize data like json.dump(indent=2), nested depth spaces deep, as bytes"""
+    if orjson is not None:
+        text = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        text = json.dumps(data, indent=2).encode()
+    # Newlines inside strings are escaped, so every raw newline is indentation
+    return text.replace(b'\n', b'\n' + b' ' * depth)
+
+@lru_cache(maxsize=None)
+def compile_code(code):
+    """Parse, check and compile a question's code once; repeated code strings reuse the code object"""
+    tree = ast.parse(code, '<string>', 'eval')
+    # Question code only needs df, pd and a few builtins; no dunder attribute tricks
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id not in _EVAL_NAMES:
+            raise NameError(f"name '{node.id}' is not allowed in question code")
+        if isinstance(node, ast.Attribute) and node.attr.startswith('_'):
+            raise AttributeError(f"attribute '{node.attr}' is not allowed in question code")
+    return compile(tree, '<string>', 'eval')
+
+def read_dataset(csv_path, columns):
+    """Read the given columns of a CSV, plus the first three every preview shows"""
+    # Header only, with the C parser's names (duplicates come back as x, x.1)
+    header = pd.read_csv(csv_path, nrows=0).columns
+    usecols = [c for i, c in enumerate(header) if i < 3 or c in columns]
+    
+    # pyarrow only knows the raw header cells. A column the C parser renamed (a blank
+    # cell read as Unnamed: 0, or a duplicate read as x.1) or a duplicated name is
+    # missing or ambiguous there, so those go straight to the C parser.
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        raw_counts = Counter(next(csv.reader(f), []))
+    
+    df = None
+    if all(raw_counts[c] == 1 for c in usecols):
+        try:
+            df = pd.read_csv(csv_path, engine='pyarrow', usecols=usecols)
+        except ImportError:
+            pass
+    if df is None:
+        df = pd.read_csv(csv_path, usecols=usecols)
+    return df
+
+def evaluate_question(question, df, stats):
     """
     Evaluate if a question makes semantic sense and if the code produces meaningful results
+    
+    stats maps each column of df to (nunique, row count), precomputed once per dataset.
+    Returns (flags, reasons); the question passes when flags == FLAG_OK.
     """
-    evaluation = {
-        'makes_sense': True,
-        'reasons': [],
-        'actual_result': None,
-        'is_meaningful': True
-    }
+    flags = FLAG_OK
+    reasons = []
     
     # Check for common issues
     q_text = question['question'].lower()
     code = question['code']
     
     # Issue 1: Asking for average/sum of IDs or codes
-    if any(word in question.get('column', '').lower() for word in ['id', 'code', 'number', 'zip']):
-        if any(op in code for op in ['.mean()', '.sum()']):
-            evaluation['makes_sense'] = False
-            evaluation['reasons'].append('Calculating mean/sum of IDs or codes is not meaningful')
+    if _ID_RE.search(question.get('column', '')):
+        if _OP_RE.search(code):
+            flags &= ~FLAG_MAKES_SENSE
+            reasons.append(REASON_ID_AGGREGATE)
     
     # Issue 2: Grouping by high-cardinality columns
     if 'groupby' in code:
         groupby_col = question.get('column', '')
-        if groupby_col in df.columns:
-            unique_ratio = df[groupby_col].nunique() / len(df)
-            if unique_ratio > 0.5:
-                evaluation['makes_sense'] = False
-                evaluation['reasons'].append(f'Grouping by {groupby_col} has too many unique values ({df[groupby_col].nunique()})')
+        n_unique, total = stats.get(groupby_col, (None, None))
+        if n_unique and n_unique / total > 0.5:
+            flags &= ~FLAG_MAKES_SENSE
+            reasons.append(f'Grouping by {groupby_col} has too many unique values ({n_unique})')
     
     # Issue 3: Empty or trivial results
     try:
-        result = eval(code)
-        evaluation['actual_result'] = result
+        result = eval(compile_code(code), {'df': df, 'pd': pd, '__builtins__': _EVAL_BUILTINS})
         
         # Check if result is empty
         if isinstance(result, pd.DataFrame) and len(result) == 0:
-            evaluation['is_meaningful'] = False
-            evaluation['reasons'].append('Query returns empty result')
+            flags &= ~FLAG_MEANINGFUL
+            reasons.append(REASON_EMPTY)
         
         # Check if result is too large (for value_counts)
         if isinstance(result, pd.Series) and len(result) > 100:
-            evaluation['is_meaningful'] = False
-            evaluation['reasons'].append('Result has too many categories to be useful')
+            flags &= ~FLAG_MEANINGFUL
+            reasons.append(REASON_TOO_MANY)
             
     except Exception as e:
-        evaluation['makes_sense'] = False
-        evaluation['reasons'].append(f'Code execution error: {str(e)}')
+        flags &= ~FLAG_MAKES_SENSE
+        reasons.append(f'Code execution error: {str(e)}')
     
     # Issue 4: Semantically odd questions
-    odd_patterns = [
-        ('average.*name', 'Cannot average names'),
-        ('sum.*category', 'Cannot sum categories'),
-        ('total.*id', 'Summing IDs is not meaningful'),
-    ]
+    matched = {m.lastindex for m in _ODD_RE.finditer(q_text)}
+    for i, (_, reason) in enumerate(_ODD_PATTERNS, 1):
+        if i in matched:
+            flags &= ~FLAG_MAKES_SENSE
+            reasons.append(reason)
     
-    for pattern, reason in odd_patterns:
-        if pattern.replace('.*', ' ') in q_text:
-            evaluation['makes_sense'] = False
-            evaluation['reasons'].append(reason)
-    
-    return evaluation
+    return flags, reasons
+
+# (dataset, question columns) -> (preview columns, preview rows), filled per process
+_preview_cache = {}
 
 def create_final_question(raw_question, dataset_info):
     """
     Convert a raw question into the final format with context and preview
-    """
-    df = dataset_info['df']
     
+    concepts and hint are left for main() to add when the question is written.
+    """
     # Get relevant columns for preview
     cols_in_question = [raw_question.get('column')]
     if 'other_column' in raw_question:
         cols_in_question.append(raw_question['other_column'])
     
-    # Add some context columns
-    preview_cols = list(dict.fromkeys(cols_in_question + list(df.columns)[:3]))[:5]
-    preview_data = df[preview_cols].head(5).values.tolist()
-    
-    # Create context based on dataset
-    contexts = {
-        'powerplants.csv': 'This dataset contains information about US power plants including their location, energy source, and production capacity.',
-        'motorcycles.csv': 'This dataset contains technical specifications for motorcycles from various manufacturers.',
-        'foods.csv': 'This dataset contains nutritional information for pet food products.',
-        'grammys.csv': 'This dataset contains Grammy award nominations and winners from 1990-2023.',
-        'race-places.csv': 'This dataset contains race results for various drivers over multiple years.',
-        'tickets-tiny.csv': 'This dataset contains traffic violation records with demographic information.'
-    }
+    # The preview only depends on the dataset and the question's columns
+    key = (raw_question['dataset'], *cols_in_question)
+    preview = _preview_cache.get(key)
+    if preview is None:
+        df = dataset_info['df']
+        col_idx = dataset_info['col_idx']
+        # Add some context columns
+        preview_cols = list(dict.fromkeys(cols_in_question + list(df.columns)[:3]))[:5]
+        preview_data = dataset_info['head5'][:, [col_idx[c] for c in preview_cols]].tolist()
+        preview = _preview_cache[key] = (preview_cols, preview_data)
+    preview_cols, preview_data = preview
+    
+    # Only build the fallback context for datasets without a written one
+    dataset_name = raw_question['dataset']
+    context = _CONTEXTS.get(dataset_name)
+    if context is None:
+        context = f'Dataset of {dataset_name}'
     
     final_question = {
-        'dataset': raw_question['dataset'],
+        'dataset': dataset_name,
         'dataPreview': preview_data,
         'dataColumns': preview_cols,
-        'context': contexts.get(raw_question['dataset'], 'Dataset of ' + raw_question['dataset']),
+        'context': context,
         'question': raw_question['question'],
         'canonicalAnswer': {
             'code': raw_question['code'],
             'result': raw_question['result']
         },
-        'difficulty': raw_question['difficulty'],
-        'concepts': determine_concepts(raw_question['code']),
-        'hint': generate_hint(raw_question)
+        'difficulty': raw_question['difficulty']
     }
     
     return final_question
 
+# Substring -> concept tags, in the order concepts are listed. For a table this
+# small, plain `in` checks (C-level searches) beat one combined regex scan.
+_CONCEPT_PATTERNS = (
+    ('value_counts()', 'value_counts'),
+    ('groupby(', 'groupby'),
+    ('.mean()', 'mean'),
+    ('.sum()', 'sum'),
+    ('.max()', 'max'),
+    ('.min()', 'min'),
+    ('nlargest(', 'nlargest'),
+    ('nsmallest(', 'nsmallest'),
+    ('.nunique()', 'nunique'),
+    ('.idxmax()', 'idxmax'),
+    ('len(df[', 'filtering'),
+    ('df[df[', 'boolean_indexing'),
+    ('.str.contains(', 'string_contains'),
+    ('.sort_values(', 'sorting')
+)
+
 def determine_concepts(code):
     """Determine which pandas concepts are used in the code"""
-    concepts = []
-    
-    concept_patterns = [
-        ('value_counts()', 'value_counts'),
-        ('groupby(', 'groupby'),
-        ('.mean()', 'mean'),
-        ('.sum()', 'sum'),
-        ('.max()', 'max'),
-        ('.min()', 'min'),
-        ('nlargest(', 'nlargest'),
-        ('nsmallest(', 'nsmallest'),
-        ('.nunique()', 'nunique'),
-        ('.idxmax()', 'idxmax'),
-        ('len(df[', 'filtering'),
-        ('df[df[', 'boolean_indexing'),
-        ('.str.contains(', 'string_contains'),
-        ('.sort_values(', 'sorting')
-    ]
-    
-    for pattern, concept in concept_patterns:
-        if pattern in code:
-            concepts.append(concept)
-    
-    return concepts
+    return [concept for pattern, concept in _CONCEPT_PATTERNS if pattern in code]
 
 def generate_hint(question):
     """Generate a helpful hint based on the question type"""
-    hints = {
-        'value_counts_basic': 'Count how many times each value appears',
-        'groupby_mean': 'Group the data first, then calculate the average',
-        'filter_equals': 'Filter the dataframe to only include matching rows',
-        'nlargest': 'Find the rows with the highest values',
-        'string_contains': 'Use string methods to search for partial matches'
-    }
+    return _HINTS.get(question.get('template_id', ''), 'Think about what operation would answer this question')
+
+# Loaded datasets, set in each worker process by _init_worker
+_datasets = None
+
+def _init_worker(datasets):
+    """Keep the loaded datasets in the worker so they aren't sent with every question"""
+    global _datasets
+    _datasets = datasets
+
+def evaluate_and_finalize(q, dataset):
+    """Review one raw question; returns (final question, None) or (None, rejection reasons)"""
+    if q['status'] != 'valid':
+        return None, 'Invalid code'
+    
+    if not dataset:
+        return None, 'Dataset not found'
     
-    return hints.get(question.get('template_id', ''), 'Think about what operation would answer this question')
+    # Evaluate the question
+    flags, reasons = evaluate_question(q, dataset['df'], dataset['stats'])
+    
+    if flags == FLAG_OK:
+        # Convert to final format
+        return create_final_question(q, dataset), None
+    return None, reasons
+
+def review_run(dataset_name, questions):
+    """Review consecutive questions from one dataset, looking the dataset up once"""
+    dataset = _datasets.get(dataset_name)
+    return [evaluate_and_finalize(q, dataset) for q in questions]
 
 def main():
     """Review and filter questions"""
@@ -159,73 +286,102 @@ def main():
     
     print(f"Loaded {len(raw_questions)} raw questions")
     
+    # Columns each dataset's questions refer to; only these are loaded
+    referenced = {}
+    for q in raw_questions:
+        cols = referenced.setdefault(q['dataset'], set())
+        cols.add(q.get('column'))
+        cols.add(q.get('other_column'))
+    
     # Load datasets for evaluation
     datasets = {}
     datasets_dir = '../datasets'
     
     for dataset_name in ['powerplants.csv', 'motorcycles.csv', 'foods.csv', 'grammys.csv', 'race-places.csv', 'tickets-tiny.csv']:
         try:
-            df = pd.read_csv(os.path.join(datasets_dir, dataset_name))
+            df = read_dataset(os.path.join(datasets_dir, dataset_name),
+                              referenced.get(dataset_name, set()) | {'state'})
             # Fix column name issue in powerplants
             if dataset_name == 'powerplants.csv' and 'state' not in df.columns:
                 # Try to extract state from other columns or use a default
                 df['state'] = 'Unknown'  # This would need proper state mapping
-            datasets[dataset_name] = {'df': df, 'name': dataset_name}
+            # Cardinality per column for the groupby check, computed once per dataset
+            stats = {col: (n_unique, len(df)) for col, n_unique in df.nunique().items()}
+            # First five rows as one object array, sliced by column position for previews
+            head5 = df.head(5).to_numpy(dtype=object)
+            col_idx = {col: i for i, col in enumerate(df.columns)}
+            datasets[dataset_name] = {'df': df, 'name': dataset_name, 'stats': stats,
+                                      'head5': head5, 'col_idx': col_idx}
         except Exception as e:
             print(f"Error loading {dataset_name}: {e}")
     
     # Evaluate each question
-    good_questions = []
     rejected_questions = []
+    good_count = 0
+    dataset_counts = {}
     
-    for q in raw_questions:
-        if q['status'] != 'valid':
-            rejected_questions.append((q, 'Invalid code'))
-            continue
-            
-        dataset = datasets.get(q['dataset'])
-        if not dataset:
-            rejected_questions.append((q, 'Dataset not found'))
-            continue
+    # The bank is grouped by dataset; split it into same-dataset runs of up to 64 questions
+    runs = []
+    for dataset_name, group in groupby(raw_questions, key=itemgetter('dataset')):
+        group = list(group)
+        for i in range(0, len(group), 64):
+            runs.append((dataset_name, group[i:i + 64]))
+    
+    # Runs are independent, so review them across processes; map keeps bank order.
+    # Kept questions are streamed to the output as they come back, in json.dump(indent=2) layout.
+    # The file is written next to the output and swapped in at the end, so a failure
+    # part-way leaves the previous questions_filtered.json intact
+    output_path = 'questions_filtered.json'
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f, \
+                ProcessPoolExecutor(initializer=_init_worker, initargs=(datasets,)) as executor:
+            f.write(b'{\n  "questions": [')
+            results = executor.map(review_run, [name for name, _ in runs], [qs for _, qs in runs])
+            for q, (final_q, reasons) in zip(raw_questions, chain.from_iterable(results)):
+                if final_q is None:
+                    # Reasons arrive as fresh copies from the workers; map the fixed messages
+                    # back to their shared objects and leave per-question formatted ones alone
+                    if isinstance(reasons, list):
+                        reasons = [_FIXED_REASONS.get(reason, reason) for reason in reasons]
+                    rejected_questions.append((q, reasons))
+                    continue
+                # Concepts and hint are only worked out for questions that are written
+                final_q['concepts'] = determine_concepts(q['code'])
+                final_q['hint'] = generate_hint(q)
+                f.write(b',\n    ' if good_count else b'\n    ')
+                f.write(dump_indented(final_q, 4))
+                good_count += 1
+                # Count questions per dataset
+                dataset_counts[final_q['dataset']] = dataset_counts.get(final_q['dataset'], 0) + 1
             
-        # Evaluate the question
-        evaluation = evaluate_question(q, dataset['df'])
+            metadata = {
+                'generatedAt': data['generated_at'],
+                'totalQuestions': good_count,
+                'datasets': dataset_counts
+            }
+            f.write(b'\n  ],\n  "metadata": ' if good_count else b'],\n  "metadata": ')
+            f.write(dump_indented(metadata, 2))
+            f.write(b'\n}')
         
-        if evaluation['makes_sense'] and evaluation['is_meaningful']:
-            # Convert to final format
-            final_q = create_final_question(q, dataset)
-            good_questions.append(final_q)
-        else:
-            rejected_questions.append((q, evaluation['reasons']))
-    
-    print(f"\nGood questions: {len(good_questions)}")
-    print(f"Rejected questions: {len(rejected_questions)}")
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
     
+    # Build the whole report and write it in one go
+    lines = [
+        f"\nGood questions: {good_count}",
+        f"Rejected questions: {len(rejected_questions)}",
+        "\nExamples of rejected questions:",
+    ]
     # Show some examples of rejected questions
-    print("\nExamples of rejected questions:")
     for q, reasons in rejected_questions[:5]:
-        print(f"- {q['question']}")
-        print(f"  Reasons: {reasons}")
-    
-    # Save the good questions
-    output = {
-        'questions': good_questions,
-        'metadata': {
-            'generatedAt': data['generated_at'],
-            'totalQuestions': len(good_questions),
-            'datasets': {}
-        }
-    }
-    
-    # Count questions per dataset
-    for q in good_questions:
-        dataset = q['dataset']
-        output['metadata']['datasets'][dataset] = output['metadata']['datasets'].get(dataset, 0) + 1
-    
-    with open('questions_filtered.json', 'w') as f:
-        json.dump(output, f, indent=2)
-    
-    print(f"\nSaved {len(good_questions)} good questions to questions_filtered.json")
+        lines.append(f"- {q['question']}")
+        lines.append(f"  Reasons: {reasons}")
+    lines.append(f"\nSaved {good_count} good questions to questions_filtered.json\n")
+    sys.stdout.write('\n'.join(lines))
+    sys.stdout.flush()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file